@@ -62,6 +62,9 @@ class Config:
         self.http_port: int = int(os.getenv("HTTP_PORT", "8080"))
         self.site_url: str = self._get_required_env("SITE_URL")
         self.host: str = os.getenv("HOST", "0.0.0.0")
+        # waitress worker threads; every request holds one for its uniform-response
+        # padding (up to 0.5s), so this bounds throughput at about threads / 0.5 req/s
+        self.web_server_threads: int = max(1, int(os.getenv("WEB_SERVER_THREADS", "100")))
         
         # MQTT Configuration
         self.mqtt_enabled: bool = os.getenv("MQTT_ENABLED", "false").lower() in (
@@ -77,6 +80,13 @@ class Config:
             self.mqtt_password: str = os.getenv("MQTT_PASSWORD", "")
             self.mqtt_keepalive: int = int(os.getenv("MQTT_KEEPALIVE", "60"))
             self.mqtt_qos: int = int(os.getenv("MQTT_QOS", "1"))
+            # "none": fire-and-forget; "batch": wait for broker acks once per batch
+            self.mqtt_confirm_mode: str = os.getenv("MQTT_CONFIRM_MODE", "none").lower()
+            if self.mqtt_confirm_mode not in ("none", "batch"):
+                logging.warning(
+                    f"Invalid MQTT_CONFIRM_MODE '{self.mqtt_confirm_mode}', using 'none'"
+                )
+                self.mqtt_confirm_mode = "none"
             self.mqtt_topic_prefix: str = os.getenv(
                 "MQTT_TOPIC_PREFIX",
                 "mikrotik/whitelist/ip"
@@ -89,6 +99,7 @@ class Config:
             self.mqtt_password = ""
             self.mqtt_keepalive = 60
             self.mqtt_qos = 1
+            self.mqtt_confirm_mode = "none"
             self.mqtt_topic_prefix = "mikrotik/whitelist/ip"
             
         # Global exclude IPs (always-open policy) as CIDR
@@ -9,15 +9,21 @@ import logging
 from typing import Optional, List
 from ..db.manager import db_manager
 from ..db.models import AccessRequest, UserSession, AccessStatus, SOURCE_TELEGRAM
+from ..utils.session_cache import TTLCache
 
 logger = logging.getLogger(__name__)
 
+# Web session lookup cache: entries per process and seconds before re-reading the DB
+SESSION_CACHE_SIZE = 10000
+SESSION_CACHE_TTL = 30.0
+
 
 class AccessManager:
     """Access manager that provides backward compatibility with database backend."""
     
     def __init__(self) -> None:
         """Initialize access manager with database backend."""
+        self._session_cache = TTLCache(SESSION_CACHE_SIZE, SESSION_CACHE_TTL)
         logger.info("Access manager initialized with database backend")
     
     def create_session(
@@ -28,16 +34,32 @@ class AccessManager:
         source: str = SOURCE_TELEGRAM,
     ) -> UserSession:
         """Create a new user session."""
-        return db_manager.create_session(
+        session = db_manager.create_session(
             source, telegram_user_id, chat_id, expiry_seconds
         )
+        self._session_cache.set(session.token, session)
+        return session
 
     def get_session(self, token: str) -> Optional[UserSession]:
-        """Get session by token."""
-        return db_manager.get_session(token)
+        """Get session by token, served from the in-process cache when possible.
+
+        Cached sessions are the same objects that use_atomic()/set_ip() update,
+        so the cache stays consistent with writes made by this process.
+        """
+        session = self._session_cache.get(token)
+        if session is not None:
+            if not session.is_expired():
+                return session
+            self._session_cache.pop(token)
+
+        session = db_manager.get_session(token)
+        if session is not None:
+            self._session_cache.set(token, session)
+        return session
 
     def remove_session(self, token: str) -> None:
         """Remove session by token."""
+        self._session_cache.pop(token)
         db_manager.remove_session(token)
 
     def create_access_request(
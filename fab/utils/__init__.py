@@ -2,7 +2,8 @@
 Utils package for FAB.
 
 Contains utility modules for common functionality like IP address
-handling, MQTT integration, internationalization (i18n), and other helper functions.
+handling, MQTT integration, internationalization (i18n), session caching,
+and other helper functions.
 """
 
-__all__ = ['mqtt', 'ip_utils', 'i18n']
+__all__ = ['mqtt', 'ip_utils', 'i18n', 'session_cache']
@@ -5,11 +5,15 @@ Handles persistent connection and message publishing to MQTT broker
 for firewall access events with automatic reconnection and TTL cleanup.
 """
 
+import heapq
 import json
 import logging
+import queue
+import socket
 import threading
 import time
-from typing import Optional, Dict, Any
+from functools import lru_cache
+from typing import Optional, Dict, Any, List, Tuple
 
 try:
     import paho.mqtt.client as mqtt
@@ -22,45 +26,57 @@ from ..config import config
 
 logger = logging.getLogger(__name__)
 
+# Delay before retrying a failed TTL clear publish, seconds
+EXPIRY_RETRY_DELAY = 10.0
+# Pending publishes buffered for the publisher worker
+PUBLISH_QUEUE_SIZE = 10000
+# Maximum messages published per worker wakeup
+PUBLISH_BATCH_SIZE = 64
+# How long a batch waits for broker acknowledgements in "batch" confirm mode
+CONFIRM_TIMEOUT = 5.0
+# How long stop() waits for the publisher to flush its queue; well above
+# CONFIRM_TIMEOUT so several ack-waiting batches can still complete
+PUBLISHER_STOP_TIMEOUT = 30.0
+# Aggregate publish stats are logged every N messages or T seconds
+PUBLISH_LOG_EVERY = 1000
+PUBLISH_LOG_INTERVAL = 5.0
+# Kernel TCP keepalive for the broker socket: idle seconds, probe interval, probes
+TCP_KEEPALIVE_OPTIONS = (("TCP_KEEPIDLE", 60), ("TCP_KEEPINTVL", 20), ("TCP_KEEPCNT", 3))
+
+
+@lru_cache(maxsize=64)
+def _open_payload(ttl: int) -> Tuple[str, bytes]:
+    """Serialize the whitelist open payload as (text for logs, UTF-8 body).
+
+    TTLs come from a few fixed durations, so both forms are built once.
+    """
+    text = json.dumps({"ttl": ttl}, ensure_ascii=False)
+    return text, text.encode("utf-8")
+
 
 class MqttPublisher:
-    """Persistent MQTT publisher with automatic reconnection."""
+    """Persistent MQTT publisher with automatic reconnection.
+
+    Keepalive pings and reconnects are handled natively by paho's network
+    thread (loop_start); the publisher only tracks connection state.
+    """
 
     def __init__(self) -> None:
         self._client: Optional["mqtt.Client"] = None
         self._connected = False
-        self._connection_lock = threading.RLock()
-        self._monitor_thread: Optional[threading.Thread] = None
-        self._monitor_running = False
-        self._last_connect_attempt = 0.0
+        self._connection_lock = threading.Lock()
+        # time.monotonic_ns() of the last attempt; 0 if never attempted
+        self._last_connect_attempt = 0
+        self._qos = config.mqtt_qos
 
     def connect(self) -> bool:
         """Establish persistent connection to MQTT broker."""
-        if not MQTT_AVAILABLE:
-            logger.error("paho-mqtt library not available, MQTT disabled")
-            return False
-
         with self._connection_lock:
-            if self._client is None:
-                self._client = self._build_client()
-
-            try:
-                self._client.connect(
-                    config.mqtt_host,
-                    config.mqtt_port,
-                    config.mqtt_keepalive
-                )
-                self._client.loop_start()
-                self._start_monitor()
-                return True
-            except Exception as e:
-                logger.error(f"Failed to connect to MQTT broker: {e}")
-                return False
+            return self._connect_locked()
 
     def disconnect(self) -> None:
         """Disconnect from MQTT broker."""
         with self._connection_lock:
-            self._stop_monitor()
             if self._client:
                 try:
                     self._client.loop_stop()
@@ -73,56 +89,129 @@ class MqttPublisher:
             self._client = None
             self._connected = False
 
-    def publish(self, topic: str, payload: str, retain: bool) -> bool:
+    def publish(self, topic: str, payload: bytes, retain: bool) -> bool:
         """Publish a message to MQTT with optional retain flag."""
-        with self._connection_lock:
-            if not self._client and not self.connect():
-                return False
-
-            if not self._connected and not self._attempt_reconnect():
-                return False
-
-            try:
-                result = self._client.publish(
-                    topic,
-                    payload=payload,
-                    qos=config.mqtt_qos,
-                    retain=retain
-                )
-                if result.rc != mqtt.MQTT_ERR_SUCCESS:
-                    logger.warning(f"MQTT publish failed: rc={result.rc}")
-                    return False
-                return True
-            except Exception as e:
-                logger.error(f"MQTT publish error: {e}")
-                return False
+        return self._send(topic, payload, retain) is not None
+
+    def send_batch(
+        self,
+        messages: List[Tuple[str, bytes]],
+        retain: bool
+    ) -> List[Optional["mqtt.MQTTMessageInfo"]]:
+        """Publish messages back-to-back without waiting for the broker.
+
+        Returns paho's message info per message, or None if paho did not
+        accept it. Accepted messages keep being delivered by paho even if
+        they are not acknowledged in time.
+        """
+        return [self._send(topic, payload, retain) for topic, payload in messages]
+
+    @staticmethod
+    def wait_for_acks(infos: List[Optional["mqtt.MQTTMessageInfo"]], timeout: float) -> List[bool]:
+        """Wait once for broker acknowledgements of a sent batch.
+
+        Returns one flag per message: True if the broker confirmed it
+        (PUBACK/PUBCOMP, or sent for QoS 0) within the shared timeout.
+        """
+        deadline = time.monotonic() + timeout
+        results = []
+        for info in infos:
+            if info is None:
+                results.append(False)
+                continue
+            info.wait_for_publish(max(0.0, deadline - time.monotonic()))
+            results.append(info.is_published())
+        return results
+
+    def _send(self, topic: str, payload: bytes, retain: bool) -> Optional["mqtt.MQTTMessageInfo"]:
+        client = self._client
+        if client is None:
+            with self._connection_lock:
+                if not self._client and not self._connect_locked():
+                    return None
+                client = self._client
+        elif not self._connected:
+            # Broker is down and paho's network thread is reconnecting
+            return None
+
+        # paho guards its outgoing queue internally, so concurrent publishers
+        # do not need to serialize on the connection lock
+        try:
+            result = client.publish(
+                topic,
+                payload=payload,
+                qos=self._qos,
+                retain=retain
+            )
+            if result.rc != mqtt.MQTT_ERR_SUCCESS:
+                logger.warning(f"MQTT publish failed: rc={result.rc}")
+                return None
+            return result
+        except Exception as e:
+            logger.error(f"MQTT publish error: {e}")
+            return None
 
     def is_connected(self) -> bool:
         """Check whether the MQTT client is connected."""
-        with self._connection_lock:
-            return self._connected
+        # Plain attribute read is atomic; no lock needed
+        return self._connected
 
     def get_connection_info(self) -> Dict[str, Any]:
         """Get connection info for monitoring."""
-        with self._connection_lock:
-            return {
-                "connected": self._connected,
-                "last_connect_attempt": self._last_connect_attempt,
-                "host": config.mqtt_host,
-                "port": config.mqtt_port,
-                "client_id": config.mqtt_client_id
-            }
+        return {
+            "connected": self._connected,
+            "last_connect_attempt": self._last_connect_wall_time(),
+            "host": config.mqtt_host,
+            "port": config.mqtt_port,
+            "client_id": config.mqtt_client_id
+        }
+
+    def _last_connect_wall_time(self) -> float:
+        """Convert the monotonic last-attempt stamp to a Unix timestamp for reporting."""
+        attempt = self._last_connect_attempt
+        if not attempt:
+            return 0.0
+        return time.time() - (time.monotonic_ns() - attempt) / 1e9
+
+    def _connect_locked(self) -> bool:
+        """Connect the client; caller must hold ``_connection_lock``."""
+        if not MQTT_AVAILABLE:
+            logger.error("paho-mqtt library not available, MQTT disabled")
+            return False
+
+        if self._client is None:
+            self._client = self._build_client()
+
+        self._last_connect_attempt = time.monotonic_ns()
+        try:
+            self._client.connect(
+                config.mqtt_host,
+                config.mqtt_port,
+                config.mqtt_keepalive
+            )
+            return True
+        except Exception as e:
+            logger.error(f"Failed to connect to MQTT broker: {e}")
+            return False
+        finally:
+            # The network thread keeps the connection alive and retries
+            # with backoff, including after a failed first attempt
+            self._client.loop_start()
 
     def _build_client(self) -> "mqtt.Client":
+        self._qos = config.mqtt_qos
         client = mqtt.Client(client_id=config.mqtt_client_id, clean_session=True)
         if config.mqtt_username or config.mqtt_password:
             client.username_pw_set(config.mqtt_username, config.mqtt_password)
         client.on_connect = self._on_connect
+        client.on_connect_fail = self._on_connect_fail
         client.on_disconnect = self._on_disconnect
+        client.on_socket_open = self._on_socket_open
         client.reconnect_delay_set(min_delay=1, max_delay=30)
         return client
 
     def _on_connect(self, client, userdata, flags, rc):
+        self._last_connect_attempt = time.monotonic_ns()
         if rc == 0:
             self._connected = True
             logger.info("MQTT connected")
@@ -130,61 +219,57 @@ class MqttPublisher:
             self._connected = False
             logger.error(f"MQTT connection failed with rc={rc}")
 
+    def _on_connect_fail(self, client, userdata):
+        self._last_connect_attempt = time.monotonic_ns()
+        logger.warning("MQTT reconnect attempt failed")
+
     def _on_disconnect(self, client, userdata, rc):
         self._connected = False
         if rc != 0:
             logger.warning(f"MQTT disconnected unexpectedly (rc={rc})")
 
-    def _attempt_reconnect(self) -> bool:
-        if not self._client:
-            return False
-        now = time.time()
-        if now - self._last_connect_attempt < 5.0:
-            return False
-        self._last_connect_attempt = now
+    def _on_socket_open(self, client, userdata, sock):
+        # Send small publishes without Nagle delay and let the kernel detect
+        # dead broker links between MQTT keepalive pings
         try:
-            self._client.reconnect()
-            return True
-        except Exception as e:
-            logger.warning(f"MQTT reconnect failed: {e}")
-            return False
-
-    def _start_monitor(self) -> None:
-        if self._monitor_thread and self._monitor_thread.is_alive():
-            return
-        self._monitor_running = True
-        self._monitor_thread = threading.Thread(
-            target=self._monitor_worker,
-            name="MQTT-Monitor",
-            daemon=True
-        )
-        self._monitor_thread.start()
-
-    def _stop_monitor(self) -> None:
-        self._monitor_running = False
-        if self._monitor_thread and self._monitor_thread.is_alive():
-            self._monitor_thread.join(timeout=5.0)
-
-    def _monitor_worker(self) -> None:
-        while self._monitor_running:
-            time.sleep(5.0)
-            if not self._monitor_running:
-                break
-            with self._connection_lock:
-                if not self._connected:
-                    self._attempt_reconnect()
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+            for name, value in TCP_KEEPALIVE_OPTIONS:
+                option = getattr(socket, name, None)
+                if option is not None:
+                    sock.setsockopt(socket.IPPROTO_TCP, option, value)
+        except (AttributeError, OSError) as e:
+            logger.debug(f"Could not tune MQTT socket options: {e}")
 
 
 class MqttService:
     """MQTT service with TTL cleanup for whitelist topics."""
 
     def __init__(self) -> None:
-        self.publisher = MqttPublisher()
+        self._publisher: Optional[MqttPublisher] = None
         self.enabled = config.mqtt_enabled
-        self._expiry_lock = threading.RLock()
+        self._topic_prefix = f"{config.mqtt_topic_prefix}/"
+        self._expiry_lock = threading.Lock()
+        self._expiry_cv = threading.Condition(self._expiry_lock)
         self._expiry_map: Dict[str, float] = {}
+        # Min-heap of (expire_at, topic); entries not matching _expiry_map are stale
+        self._expiry_heap: List[Tuple[float, str]] = []
         self._cleanup_thread: Optional[threading.Thread] = None
         self._cleanup_running = False
+        # (topic, payload, ttl) items; ttl is None for clear messages
+        self._publish_queue: "queue.Queue[Optional[Tuple[str, bytes, Optional[int]]]]" = (
+            queue.Queue(maxsize=PUBLISH_QUEUE_SIZE)
+        )
+        self._publisher_thread: Optional[threading.Thread] = None
+        self._published_count = 0
+        self._published_since = time.monotonic()
+
+    @property
+    def publisher(self) -> MqttPublisher:
+        """MQTT publisher, created on first use so a disabled service holds none."""
+        if self._publisher is None:
+            self._publisher = MqttPublisher()
+        return self._publisher
 
     def start(self) -> bool:
         """Start MQTT service."""
@@ -193,7 +278,9 @@ class MqttService:
             return True
 
         logger.info("Starting MQTT service...")
-        connected = self.publisher.connect()
+        publisher = self.publisher
+        self._start_publisher()
+        connected = publisher.connect()
         self._start_cleanup()
         return connected
 
@@ -202,12 +289,14 @@ class MqttService:
         self._stop_cleanup()
         if self.enabled:
             logger.info("Stopping MQTT service...")
-            self.publisher.disconnect()
+            self._stop_publisher()
+            if self._publisher is not None:
+                self._publisher.disconnect()
 
     def publish_whitelist_open(self, ip_address: str, ttl: int) -> bool:
-        """Publish whitelist open message with TTL."""
-        message = json.dumps({"ttl": int(ttl)}, ensure_ascii=False)
-        topic = f"{config.mqtt_topic_prefix}/{ip_address}"
+        """Queue whitelist open message with TTL for publishing."""
+        message, body = _open_payload(int(ttl))
+        topic = self._topic_prefix + ip_address
 
         logger.info(f"ACCESS_EVENT: {topic} -> {message}")
         if not self.enabled:
@@ -218,27 +307,17 @@ class MqttService:
             logger.warning(f"Invalid TTL for MQTT publish: {ttl}")
             return False
 
-        success = self.publisher.publish(topic, message, retain=True)
-        if success:
-            self._schedule_expiry(topic, ttl)
-        else:
-            logger.warning("Failed to publish MQTT open message")
-        return success
+        return self._enqueue(topic, body, int(ttl))
 
     def publish_whitelist_close(self, ip_address: str) -> bool:
-        """Publish retained empty payload to remove whitelist topic."""
-        topic = f"{config.mqtt_topic_prefix}/{ip_address}"
+        """Queue retained empty payload to remove whitelist topic."""
+        topic = self._topic_prefix + ip_address
         logger.info(f"ACCESS_EVENT_CLEAR: {topic}")
         if not self.enabled:
             logger.debug("MQTT disabled, clear logged only")
             return True
 
-        success = self.publisher.publish(topic, "", retain=True)
-        with self._expiry_lock:
-            self._expiry_map.pop(topic, None)
-        if not success:
-            logger.warning("Failed to publish MQTT clear message")
-        return success
+        return self._enqueue(topic, b"", None)
 
     def get_status(self) -> Dict[str, Any]:
         """Get MQTT status for health endpoint."""
@@ -256,10 +335,125 @@ class MqttService:
             return True
         return self.publisher.is_connected()
 
-    def _schedule_expiry(self, topic: str, ttl: int) -> None:
-        expire_at = time.time() + ttl
-        with self._expiry_lock:
+    def _enqueue(self, topic: str, payload: bytes, ttl: Optional[int]) -> bool:
+        try:
+            self._publish_queue.put_nowait((topic, payload, ttl))
+            return True
+        except queue.Full:
+            logger.warning(f"MQTT publish queue full, dropping message for {topic}")
+            return False
+
+    def _start_publisher(self) -> None:
+        if self._publisher_thread and self._publisher_thread.is_alive():
+            return
+        self._publisher_thread = threading.Thread(
+            target=self._publisher_worker,
+            name="MQTT-Publisher",
+            daemon=True
+        )
+        self._publisher_thread.start()
+
+    def _stop_publisher(self) -> None:
+        if self._publisher_thread and self._publisher_thread.is_alive():
+            # Sentinel is queued behind pending messages, so they are flushed first
+            self._publish_queue.put(None)
+            self._publisher_thread.join(timeout=PUBLISHER_STOP_TIMEOUT)
+            if self._publisher_thread.is_alive():
+                # Remaining items (minus the sentinel, if still queued) are lost
+                # once the publisher disconnects
+                pending = max(0, self._publish_queue.qsize() - 1)
+                logger.warning(
+                    f"MQTT publisher still running after {PUBLISHER_STOP_TIMEOUT}s, "
+                    f"about {pending} queued messages will not be delivered"
+                )
+
+    def _publisher_worker(self) -> None:
+        running = True
+        while running:
+            try:
+                batch = [self._publish_queue.get(timeout=PUBLISH_LOG_INTERVAL)]
+            except queue.Empty:
+                # Idle: report whatever the last burst left unlogged
+                self._flush_published()
+                continue
+            while len(batch) < PUBLISH_BATCH_SIZE:
+                try:
+                    batch.append(self._publish_queue.get_nowait())
+                except queue.Empty:
+                    break
+            if None in batch:
+                running = False
+                batch = [item for item in batch if item is not None]
+            self._publish_batch(batch)
+        self._flush_published()
+
+    def _publish_batch(self, batch: List[Tuple[str, bytes, Optional[int]]]) -> None:
+        confirm = config.mqtt_confirm_mode == "batch"
+        if confirm:
+            infos = self.publisher.send_batch(
+                [(topic, payload) for topic, payload, _ in batch],
+                retain=True
+            )
+            accepted_flags = [info is not None for info in infos]
+        else:
+            accepted_flags = [
+                self.publisher.publish(topic, payload, retain=True)
+                for topic, payload, _ in batch
+            ]
+
+        # Update expiry right after sending, before any ack wait, so the
+        # cleanup thread cannot clear a just re-opened topic using its
+        # previous deadline. paho keeps delivering an unconfirmed retained
+        # open, so it must still be cleared when its TTL runs out.
+        for (topic, _, ttl), accepted in zip(batch, accepted_flags):
+            if ttl is None:
+                with self._expiry_lock:
+                    self._expiry_map.pop(topic, None)
+                if not accepted:
+                    logger.warning("Failed to publish MQTT clear message")
+            elif accepted:
+                self._schedule_expiry(topic, ttl)
+            else:
+                logger.warning("Failed to publish MQTT open message")
+
+        acked_flags = self.publisher.wait_for_acks(infos, CONFIRM_TIMEOUT) if confirm else accepted_flags
+        debug = logger.isEnabledFor(logging.DEBUG)
+        for (topic, payload, _), accepted, acked in zip(batch, accepted_flags, acked_flags):
+            if debug and acked:
+                logger.debug(
+                    f"Published MQTT message: {topic} -> {payload.decode(errors='replace')!r}"
+                )
+            if accepted and not acked:
+                logger.warning(f"MQTT message for {topic} not confirmed within {CONFIRM_TIMEOUT}s")
+        self._record_published(sum(acked_flags))
+
+    def _record_published(self, count: int) -> None:
+        now = time.monotonic()
+        if count and not self._published_count:
+            # First message since the last summary opens a new window, so
+            # idle time is not reported as publishing time
+            self._published_since = now
+        self._published_count += count
+        if not self._published_count:
+            return
+        if (self._published_count >= PUBLISH_LOG_EVERY
+                or now - self._published_since >= PUBLISH_LOG_INTERVAL):
+            self._flush_published()
+
+    def _flush_published(self) -> None:
+        """Log and reset the pending published-message count, if any."""
+        if not self._published_count:
+            return
+        elapsed = time.monotonic() - self._published_since
+        logger.info(f"Published {self._published_count} MQTT messages in {elapsed:.1f}s")
+        self._published_count = 0
+
+    def _schedule_expiry(self, topic: str, ttl: float) -> None:
+        expire_at = time.monotonic() + ttl
+        with self._expiry_cv:
             self._expiry_map[topic] = expire_at
+            heapq.heappush(self._expiry_heap, (expire_at, topic))
+            self._expiry_cv.notify()
 
     def _start_cleanup(self) -> None:
         if self._cleanup_thread and self._cleanup_thread.is_alive():
@@ -273,28 +467,44 @@ class MqttService:
         self._cleanup_thread.start()
 
     def _stop_cleanup(self) -> None:
-        self._cleanup_running = False
+        with self._expiry_cv:
+            self._cleanup_running = False
+            self._expiry_cv.notify_all()
         if self._cleanup_thread and self._cleanup_thread.is_alive():
             self._cleanup_thread.join(timeout=5.0)
 
-    def _cleanup_worker(self) -> None:
+    def _pop_expired(self) -> List[Tuple[float, str]]:
+        """Wait for the nearest deadline and pop all expired entries.
+
+        Must be called with ``_expiry_cv`` held. Returns an empty list
+        when the cleanup worker is being stopped.
+        """
         while self._cleanup_running:
-            time.sleep(5.0)
-            if not self._cleanup_running:
-                break
-            now = time.time()
+            now = time.monotonic()
             expired = []
-            with self._expiry_lock:
-                for topic, expire_at in self._expiry_map.items():
-                    if expire_at <= now:
-                        expired.append(topic)
-            for topic in expired:
-                if self.publisher.publish(topic, "", retain=True):
+            while self._expiry_heap and self._expiry_heap[0][0] <= now:
+                expire_at, topic = heapq.heappop(self._expiry_heap)
+                if self._expiry_map.get(topic) == expire_at:
+                    expired.append((expire_at, topic))
+            if expired:
+                return expired
+            timeout = self._expiry_heap[0][0] - now if self._expiry_heap else None
+            self._expiry_cv.wait(timeout)
+        return []
+
+    def _cleanup_worker(self) -> None:
+        while True:
+            with self._expiry_cv:
+                expired = self._pop_expired()
+            if not expired:
+                break
+            for expire_at, topic in expired:
+                if self.publisher.publish(topic, b"", retain=True):
                     with self._expiry_lock:
-                        self._expiry_map.pop(topic, None)
+                        if self._expiry_map.get(topic) == expire_at:
+                            del self._expiry_map[topic]
                 else:
-                    with self._expiry_lock:
-                        self._expiry_map[topic] = time.time() + 10.0
+                    self._schedule_expiry(topic, EXPIRY_RETRY_DELAY)
 
 
 # Global MQTT service instance
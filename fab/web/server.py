@@ -10,21 +10,34 @@ import time
 import re
 import uuid
 import ipaddress
-from typing import Optional, Union
+from functools import lru_cache
+from operator import attrgetter
+from typing import Dict, Optional, Tuple, Union
 from flask import (
     Flask,
     request,
     render_template,
     jsonify,
+    Response,
     session,
     redirect,
     url_for,
-    send_file,
+    send_from_directory,
 )
 from werkzeug.serving import make_server
 import threading
-import base64
-from io import BytesIO
+
+try:
+    from waitress import create_server as create_waitress_server
+    WAITRESS_AVAILABLE = True
+except ImportError:
+    WAITRESS_AVAILABLE = False
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
 
 from ..config import config
 from ..models import access as access_module
@@ -36,19 +49,41 @@ from ..utils.i18n import i18n
 logger = logging.getLogger(__name__)
 
 # Security validation constants
-ALLOWED_DURATIONS = [3600, 10800, 28800, 43200]  # 1, 3, 8, 12 hours in seconds
-MAX_DURATION = 43200  # 12 hours
-UUID_PATTERN = re.compile(r'^[0-9a-f]{8}-[0-9a-f]{4}-4[0-9a-f]{3}-[89ab][0-9a-f]{3}-[0-9a-f]{12}$')
+ALLOWED_DURATIONS = frozenset((3600, 10800, 28800, 43200))  # 1, 3, 8, 12 hours in seconds
+UUID_PATTERN = re.compile(
+    r'[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-4[0-9a-fA-F]{3}-[89abAB][0-9a-fA-F]{3}-[0-9a-fA-F]{12}'
+)
+
+# Headers that are always suspicious
+ALWAYS_DANGEROUS_HEADERS = frozenset((
+    'x-cluster-client-ip', 'x-forwarded', 'forwarded-for',
+    'x-forwarded-proto-version', 'x-real-port'
+))
+# Headers that are legitimate when NGINX_ENABLED=true, suspicious otherwise
+NGINX_HEADERS = frozenset((
+    'x-forwarded-host', 'x-forwarded-server', 'x-forwarded-ssl',
+    'x-forwarded-scheme', 'x-forwarded-proto'
+))
+STATIC_MAX_AGE = 86400  # favicon/robots.txt client cache lifetime, seconds
+MAX_FORWARDED_IPS = 5  # Reasonable number of proxies in X-Forwarded-For
+# Telegram server address prefixes (149.154.167., 149.154.175., 91.108.4., 91.108.56., 91.108.8.)
+TELEGRAM_IP_PREFIX = re.compile(r'(?:149\.154\.(?:167|175)|91\.108\.(?:4|56|8))\.')
 
 
 def get_web_user_language() -> str:
     """Get user's preferred language for web interface (from session or auto-detect)."""
     # First check if user has explicitly set a language in session
-    if 'language' in session:
-        return session['language']
+    language = session.get('language')
+    if language:
+        return language
     
     # Otherwise auto-detect from Accept-Language header
-    accept_language = request.headers.get('Accept-Language')
+    return _detect_language(request.headers.get('Accept-Language'))
+
+
+@lru_cache(maxsize=256)
+def _detect_language(accept_language: Optional[str]) -> str:
+    """Parse Accept-Language once per distinct header value."""
     return i18n.detect_language_from_header(accept_language)
 
 
@@ -64,7 +99,11 @@ def _validate_token(token: str) -> bool:
         logger.warning(f"Invalid token format: length={len(token) if token else 0}")
         return False
     
-    if not UUID_PATTERN.match(token.lower()):
+    # Cheap dash-position prefilter before entering the regex engine
+    if (
+        token[8] != '-' or token[13] != '-' or token[18] != '-' or token[23] != '-'
+        or UUID_PATTERN.fullmatch(token) is None
+    ):
         logger.warning(f"Invalid token format: {token[:8]}...")
         return False
     
@@ -77,16 +116,12 @@ def _validate_duration(duration: any) -> Optional[int]:
         # Convert to integer
         duration_int = int(duration)
         
-        # Check if it's in allowed list (prevents arbitrary values)
+        # Check if it's in allowed set (prevents arbitrary values; every
+        # allowed value is positive and at most 12 hours)
         if duration_int not in ALLOWED_DURATIONS:
             logger.warning(f"Duration not in allowed list: {duration_int}")
             return None
             
-        # Double check against max duration
-        if duration_int <= 0 or duration_int > MAX_DURATION:
-            logger.warning(f"Duration out of range: {duration_int}")
-            return None
-            
         return duration_int
         
     except (ValueError, TypeError, OverflowError):
@@ -114,58 +149,55 @@ def _validate_json_data(data: any) -> Optional[dict]:
     return data
 
 
-def _validate_ip_headers(request) -> bool:
+def _snapshot_headers(request) -> Dict[str, str]:
+    """Read request headers from the WSGI environ once, keyed by lowercase name."""
+    return {name.lower(): value for name, value in request.headers.items()}
+
+
+def _validate_ip_headers(headers: Dict[str, str], nginx_enabled: bool) -> bool:
     """Validate IP-related headers for tampering attempts."""
-    # Headers that are always suspicious
-    always_dangerous = [
-        'x-cluster-client-ip', 'x-forwarded', 'forwarded-for',
-        'x-forwarded-proto-version', 'x-real-port'
-    ]
-    
-    # Headers that are legitimate when NGINX_ENABLED=true, suspicious otherwise
-    nginx_headers = [
-        'x-forwarded-host', 'x-forwarded-server', 'x-forwarded-ssl', 
-        'x-forwarded-scheme', 'x-forwarded-proto'
-    ]
-    
-    # Check for suspicious IP-related headers
-    for header_name in request.headers.keys():
-        header_lower = header_name.lower()
-        
-        # Debug logging for troubleshooting
-        if header_lower in ['x-forwarded-host', 'x-forwarded-server', 'x-forwarded-ssl']:
-            logger.debug(f"Processing header: {header_name} -> {header_lower}")
-            logger.debug(f"nginx_enabled: {config.nginx_enabled}")
-            logger.debug(f"in always_dangerous: {header_lower in always_dangerous}")
-            logger.debug(f"in nginx_headers: {header_lower in nginx_headers}")
-        
-        if header_lower in always_dangerous:
+    debug = logger.isEnabledFor(logging.DEBUG)
+
+    # Keys are already lowercase (see _snapshot_headers)
+    for header_name, header_value in headers.items():
+        if header_name in ALWAYS_DANGEROUS_HEADERS:
             logger.warning(f"Suspicious IP header detected: {header_name}")
-        elif header_lower in nginx_headers and not config.nginx_enabled:
-            logger.warning(f"Unexpected proxy header (nginx disabled): {header_name}")
-        elif header_lower in nginx_headers and config.nginx_enabled:
-            logger.debug(f"Legitimate nginx header: {header_name}")
-            # This is expected and legitimate - no warning needed
-            
-        # Check for multiple X-Forwarded-For or X-Real-IP headers (header injection)
-        if header_lower in ['x-forwarded-for', 'x-real-ip']:
-            header_value = request.headers.get(header_name, '')
-            if ',' in header_value:
-                # Multiple IPs in one header is normal for X-Forwarded-For
-                if header_lower == 'x-forwarded-for':
-                    # Check for reasonable number of IPs (max 5 proxies)
-                    ips = [ip.strip() for ip in header_value.split(',')]
-                    if len(ips) > 5:
-                        logger.warning(f"Too many IPs in X-Forwarded-For: {len(ips)}")
-                        return False
-                else:
-                    # X-Real-IP should contain only one IP
-                    logger.warning(f"Multiple IPs in X-Real-IP header: {header_value}")
-                    return False
-    
+        elif header_name in NGINX_HEADERS:
+            if not nginx_enabled:
+                logger.warning(f"Unexpected proxy header (nginx disabled): {header_name}")
+            elif debug:
+                # This is expected and legitimate - no warning needed
+                logger.debug(f"Legitimate nginx header: {header_name}")
+        elif header_name == 'x-forwarded-for':
+            # Multiple IPs in one header is normal for X-Forwarded-For,
+            # but cap the number of proxies (header injection)
+            commas = header_value.count(',')
+            if commas >= MAX_FORWARDED_IPS:
+                logger.warning(f"Too many IPs in X-Forwarded-For: {commas + 1}")
+                return False
+        elif header_name == 'x-real-ip' and ',' in header_value:
+            # X-Real-IP should contain only one IP
+            logger.warning(f"Multiple IPs in X-Real-IP header: {header_value}")
+            return False
+
     return True
 
 
+def _json_response(data: dict) -> Response:
+    """Build a JSON response, serialized with orjson when it is installed."""
+    if ORJSON_AVAILABLE:
+        return Response(orjson.dumps(data), mimetype="application/json")
+    return jsonify(data)
+
+
+def _add_security_headers(resp):
+    """Add baseline security headers to every response."""
+    resp.headers['Referrer-Policy'] = 'no-referrer'
+    resp.headers['X-Content-Type-Options'] = 'nosniff'
+    resp.headers['X-Frame-Options'] = 'DENY'
+    return resp
+
+
 def create_app() -> Flask:
     """Create and configure Flask application."""
     app = Flask(
@@ -178,18 +210,33 @@ def create_app() -> Flask:
     app.config['SESSION_COOKIE_SECURE'] = True
     app.config['SESSION_COOKIE_HTTPONLY'] = True
     app.config['SESSION_COOKIE_SAMESITE'] = 'Strict'
+    # Templates ship with the app; don't stat them for changes on every render
+    app.config['TEMPLATES_AUTO_RELOAD'] = False
     
     # Configure Flask logging to not interfere with our logging
     import logging
     logging.getLogger('werkzeug').setLevel(logging.WARNING)
 
     # After-request hook for security headers
-    @app.after_request
-    def add_security_headers(resp):  # type: ignore
-        resp.headers['Referrer-Policy'] = 'no-referrer'
-        resp.headers['X-Content-Type-Options'] = 'nosniff'
-        resp.headers['X-Frame-Options'] = 'DENY'
-        return resp
+    app.after_request(_add_security_headers)
+
+    # Compile the access page template now instead of on the first visit
+    try:
+        app.jinja_env.get_template("access.html")
+    except Exception as e:
+        logger.warning(f"Failed to preload access.html template: {e}")
+
+    # Deployment settings are fixed for the app's lifetime; read them once
+    nginx_enabled = bool(config.nginx_enabled)
+    exclude_networks = tuple(getattr(config, 'exclude_networks', []))
+
+    def ip_excluded_from_mqtt(ip_address: Optional[str]) -> bool:
+        """Check if IP is local/private or in EXCLUDE_IPS (always open, never published)."""
+        try:
+            ip_obj = ipaddress.ip_address(ip_address or "127.0.0.1")
+        except ValueError:
+            ip_obj = ipaddress.ip_address("127.0.0.1")
+        return is_local_ip(ip_address) or any(ip_obj in net for net in exclude_networks)
     
     @app.route("/")
     def index():
@@ -198,24 +245,17 @@ def create_app() -> Flask:
     
     @app.route("/favicon.ico")
     def favicon():
-        """Serve a minimal embedded PNG favicon."""
-        # 1x1 transparent PNG
-        png_b64 = (
-            "iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAQAAAC1HAwCAAAAC0lEQVR42mP8/x8A"
-            "AwMB/aoZp5QAAAAASUVORK5CYII="
-        )
-        data = base64.b64decode(png_b64)
-        return send_file(
-            BytesIO(data),
-            mimetype="image/png",
-            as_attachment=False,
-            download_name="favicon.png",
+        """Serve a minimal PNG favicon (conditional GET, cached by clients)."""
+        return send_from_directory(
+            app.static_folder, "favicon.png", mimetype="image/png", max_age=STATIC_MAX_AGE
         )
 
     @app.route("/robots.txt")
     def robots():
         """Handle robots.txt request without warnings."""
-        return "User-agent: *\nDisallow: /\n", 200, {"Content-Type": "text/plain; charset=utf-8"}
+        return send_from_directory(
+            app.static_folder, "robots.txt", mimetype="text/plain", max_age=STATIC_MAX_AGE
+        )
 
     @app.route("/health")
     def health():
@@ -235,11 +275,11 @@ def create_app() -> Flask:
                 health_data["status"] = "degraded"
                 health_data["warnings"] = ["MQTT connection unavailable"]
             
-            return jsonify(health_data), 200
+            return _json_response(health_data), 200
             
         except Exception as e:
             logger.error(f"Health check error: {e}")
-            return jsonify({
+            return _json_response({
                 "status": "unhealthy",
                 "timestamp": time.time(),
                 "error": str(e)
@@ -267,34 +307,29 @@ def create_app() -> Flask:
     def access_page(token: str):
         """Access management page for valid tokens."""
         # Simulate uniform response time (security feature)
-        start_time = time.time()
+        start_time = time.monotonic()
         
         try:
             # Security validation
             if not _validate_token(token):
                 logger.warning(f"Invalid token format in access_page: {token[:8]}...")
                 _wait_for_uniform_response(start_time, 0.5)
-                return jsonify({"success": False, "error": "Invalid token"})
+                return _json_response({"success": False, "error": "Invalid token"})
                 
-            if not _validate_ip_headers(request):
+            headers = _snapshot_headers(request)
+            if not _validate_ip_headers(headers, nginx_enabled):
                 logger.warning("Invalid IP headers detected in access_page")
                 _wait_for_uniform_response(start_time, 0.5)
-                return jsonify({"success": False, "error": "Invalid headers"})
+                return _json_response({"success": False, "error": "Invalid headers"})
             
-            client_ip = _get_client_ip(request)
+            client_ip = _get_client_ip(headers, request.remote_addr, nginx_enabled)
             # Determine exclusion by CIDR
-            try:
-                client_ip_obj = ipaddress.ip_address(client_ip)
-            except Exception:
-                client_ip_obj = ipaddress.ip_address("127.0.0.1")
-            ip_excluded = is_local_ip(client_ip) or any(
-                client_ip_obj in net for net in getattr(config, 'exclude_networks', [])
-            )
+            ip_excluded = ip_excluded_from_mqtt(client_ip)
             session = access_module.access_manager.get_session(token)
             
             if not session or session.is_expired():
                 _wait_for_uniform_response(start_time, 0.5)
-                return jsonify({"success": False, "error": "Session not found or expired"})
+                return _json_response({"success": False, "error": "Session not found or expired"})
             
             # Get user's preferred language (from session or auto-detect)
             language = get_web_user_language()
@@ -304,10 +339,13 @@ def create_app() -> Flask:
             if not session.ip_address:
                 session.set_ip(client_ip)
             
-            # Get active requests for this user
+            # Get active requests for this user; the page shows only the newest
             active_requests = access_module.access_manager.get_active_requests_for_user(
                 session.telegram_user_id, source=session.source
             )
+            latest_request = max(
+                active_requests, key=attrgetter('created_at'), default=None
+            )
             
             # Wait for uniform response time
             _wait_for_uniform_response(start_time, 0.5)
@@ -315,7 +353,7 @@ def create_app() -> Flask:
             return render_template("access.html", 
                                  session=session,
                                  client_ip=client_ip,
-                                 active_requests=active_requests,
+                                 latest_request=latest_request,
                                  ip_excluded=ip_excluded,
                                  i18n=i18n)
         
@@ -327,32 +365,27 @@ def create_app() -> Flask:
     @app.route("/a/<token>", methods=["POST"])
     def open_access(token: str):
         """API endpoint to open firewall access."""
-        start_time = time.time()
+        start_time = time.monotonic()
         
         try:
             # Security validation
             if not _validate_token(token):
                 logger.warning(f"Invalid token format in open_access: {token[:8]}...")
                 _wait_for_uniform_response(start_time, 0.3)
-                return jsonify({"success": False, "error": "Invalid token"})
+                return _json_response({"success": False, "error": "Invalid token"})
                 
-            if not _validate_ip_headers(request):
+            headers = _snapshot_headers(request)
+            if not _validate_ip_headers(headers, nginx_enabled):
                 logger.warning("Invalid IP headers detected in open_access")
                 _wait_for_uniform_response(start_time, 0.3)
-                return jsonify({"success": False, "error": "Invalid headers"})
+                return _json_response({"success": False, "error": "Invalid headers"})
             
-            client_ip = _get_client_ip(request)
+            client_ip = _get_client_ip(headers, request.remote_addr, nginx_enabled)
             # Determine exclusion by CIDR
-            try:
-                client_ip_obj = ipaddress.ip_address(client_ip)
-            except Exception:
-                client_ip_obj = ipaddress.ip_address("127.0.0.1")
-            ip_excluded = is_local_ip(client_ip) or any(
-                client_ip_obj in net for net in getattr(config, 'exclude_networks', [])
-            )
+            ip_excluded = ip_excluded_from_mqtt(client_ip)
             if ip_excluded:
                 _wait_for_uniform_response(start_time, 0.3)
-                return jsonify({
+                return _json_response({
                     "success": False,
                     "always_open": True,
                     "message": i18n.get_text("web.messages.always_open")
@@ -364,38 +397,31 @@ def create_app() -> Flask:
             if not data or "duration" not in data:
                 logger.warning(f"Invalid JSON data in open_access from IP {client_ip}")
                 _wait_for_uniform_response(start_time, 0.3)
-                return jsonify({"success": False, "error": "Invalid payload"})
+                return _json_response({"success": False, "error": "Invalid payload"})
             
             # Strict duration validation
             duration = _validate_duration(data["duration"])
             if duration is None:
                 logger.warning(f"Invalid duration in open_access from IP {client_ip}: {data.get('duration')}")
                 _wait_for_uniform_response(start_time, 0.3)
-                return jsonify({"success": False, "error": "Invalid duration"})
+                return _json_response({"success": False, "error": "Invalid duration"})
             
             session = access_module.access_manager.get_session(token)
             
             if not session or session.is_expired():
                 _wait_for_uniform_response(start_time, 0.3)
-                return jsonify({"success": False, "error": "Session not found or expired"})
+                return _json_response({"success": False, "error": "Session not found or expired"})
             
-            # Session use/reuse logic: allow repeated open from same IP
-            if session.used:
+            # Session use/reuse logic: claim the session atomically; a session
+            # already used (earlier or by a racing request) may only be
+            # reopened from the same IP. The `used` flag just skips the UPDATE.
+            if session.used or not session.use_atomic(client_ip):
                 if session.ip_address and session.ip_address == client_ip:
                     logger.info(f"Reusing session {token[:8]} from same IP {client_ip}")
                 else:
                     logger.warning(f"Attempt to reuse already used session {token[:8]}... from IP {client_ip}")
                     _wait_for_uniform_response(start_time, 0.3)
-                    return jsonify({"success": False, "error": "Session already used"})
-            else:
-                if not session.use_atomic(client_ip):
-                    # If another thread used it, allow if same IP
-                    if session.ip_address == client_ip:
-                        logger.info(f"Reusing session {token[:8]} after race from same IP {client_ip}")
-                    else:
-                        logger.warning(f"Failed to use session {token[:8]} - race and different IP")
-                        _wait_for_uniform_response(start_time, 0.3)
-                        return jsonify({"success": False, "error": "Session already used"})
+                    return _json_response({"success": False, "error": "Session already used"})
             
             # Ensure access_manager is initialized
             if access_module.access_manager is None:
@@ -432,24 +458,12 @@ def create_app() -> Flask:
                 source=session.source,
             )
             
-            # Check if IP is local/private or excluded by config
-            # CIDR-based exclusion using config.exclude_networks
-            ip_obj = ipaddress.ip_address(client_ip)
-            ip_excluded = is_local_ip(client_ip) or any(
-                ip_obj in net for net in getattr(config, 'exclude_networks', [])
-            )
-            if ip_excluded:
-                logger.info(
-                    f"Access opened for user {session.telegram_user_id}, IP: {client_ip}, "
-                    f"duration: {duration}s - MQTT message skipped (excluded)"
-                )
-            else:
-                # Send MQTT retained message for external IPs only
-                mqtt_service.publish_whitelist_open(client_ip, duration)
-                logger.info(f"Access opened for user {session.telegram_user_id}, IP: {client_ip}, duration: {duration}s")
+            # Excluded IPs returned early above, so this is an external IP
+            mqtt_service.publish_whitelist_open(client_ip, duration)
+            logger.info(f"Access opened for user {session.telegram_user_id}, IP: {client_ip}, duration: {duration}s")
             
             _wait_for_uniform_response(start_time, 0.3)
-            return jsonify({
+            return _json_response({
                 "success": True,
                 "access_id": access_request.id,
                 "expires_at": access_request.expires_at.isoformat() if access_request.expires_at else None
@@ -457,16 +471,16 @@ def create_app() -> Flask:
         
         except ValueError as ve:
             _wait_for_uniform_response(start_time, 0.3)
-            return jsonify({"success": False, "error": str(ve)})
+            return _json_response({"success": False, "error": str(ve)})
         except Exception as e:
             logger.error(f"Error opening access: {e}")
             _wait_for_uniform_response(start_time, 0.3)
-            return jsonify({"success": False, "error": str(e)})
+            return _json_response({"success": False, "error": str(e)})
     
     @app.route("/c/<access_id>", methods=["POST"])
     def close_access(access_id: str):
         """API endpoint to close firewall access."""
-        start_time = time.time()
+        start_time = time.monotonic()
         
         try:
             # Validate access_id format (should be UUID)
@@ -475,7 +489,8 @@ def create_app() -> Flask:
                 _wait_for_uniform_response(start_time, 0.3)
                 return "OK", 200
                 
-            if not _validate_ip_headers(request):
+            headers = _snapshot_headers(request)
+            if not _validate_ip_headers(headers, nginx_enabled):
                 logger.warning("Invalid IP headers detected in close_access")
                 _wait_for_uniform_response(start_time, 0.3)
                 return "OK", 200
@@ -489,30 +504,23 @@ def create_app() -> Flask:
                 if not _validate_token(token):
                     logger.warning(f"Invalid token format in close_access: {token[:8]}...")
                     _wait_for_uniform_response(start_time, 0.3)
-                    return jsonify({"success": False, "error": "Invalid token"})
+                    return _json_response({"success": False, "error": "Invalid token"})
                     
                 session = access_module.access_manager.get_session(token)
                 if not session or session.is_expired():
                     _wait_for_uniform_response(start_time, 0.3)
-                    return jsonify({"success": False, "error": "Session not found or expired"})
+                    return _json_response({"success": False, "error": "Session not found or expired"})
             
             # Fetch access request now (needed for IP and close)
             access_request = access_module.access_manager.get_access_request(access_id)
             if not access_request:
                 _wait_for_uniform_response(start_time, 0.3)
-                return jsonify({"success": True})
+                return _json_response({"success": True})
             
             # Determine exclusion by CIDR (do not allow closing)
-            try:
-                ip_obj_close = ipaddress.ip_address(access_request.ip_address or "127.0.0.1")
-            except Exception:
-                ip_obj_close = ipaddress.ip_address("127.0.0.1")
-            ip_excluded = is_local_ip(access_request.ip_address) or any(
-                ip_obj_close in net for net in getattr(config, 'exclude_networks', [])
-            )
-            if ip_excluded:
+            if ip_excluded_from_mqtt(access_request.ip_address):
                 _wait_for_uniform_response(start_time, 0.3)
-                return jsonify({
+                return _json_response({
                     "success": False,
                     "always_open": True,
                     "message": i18n.get_text("web.messages.always_open")
@@ -523,33 +531,20 @@ def create_app() -> Flask:
             
             if not access_request:
                 _wait_for_uniform_response(start_time, 0.3)
-                return jsonify({"success": True})
+                return _json_response({"success": True})
             
-            # Check if IP is local/private or excluded by config
-            try:
-                ip_obj_close = ipaddress.ip_address(access_request.ip_address or "127.0.0.1")
-            except Exception:
-                ip_obj_close = ipaddress.ip_address("127.0.0.1")
-            ip_excluded = is_local_ip(access_request.ip_address) or any(
-                ip_obj_close in net for net in getattr(config, 'exclude_networks', [])
-            )
-            if ip_excluded:
-                logger.info(
-                    f"Access closed for request {access_request.id}, IP: {access_request.ip_address} - MQTT message skipped (excluded)"
-                )
+            # Excluded IPs returned early above; clear the retained message
+            if access_request.ip_address:
+                mqtt_service.publish_whitelist_close(access_request.ip_address)
             else:
-                # Clear MQTT retained message for external IPs only
-                if access_request.ip_address:
-                    mqtt_service.publish_whitelist_close(access_request.ip_address)
-                else:
-                    logger.warning(
-                        f"Access closed for request {access_request.id} without IP, "
-                        "MQTT clear skipped"
-                    )
-                logger.info(f"Access closed for request {access_request.id}")
+                logger.warning(
+                    f"Access closed for request {access_request.id} without IP, "
+                    "MQTT clear skipped"
+                )
+            logger.info(f"Access closed for request {access_request.id}")
             
             _wait_for_uniform_response(start_time, 0.3)
-            return jsonify({
+            return _json_response({
                 "success": True,
                 "closed_at": access_request.closed_at.isoformat() if access_request.closed_at else None
             })
@@ -557,12 +552,12 @@ def create_app() -> Flask:
         except Exception as e:
             logger.error(f"Error closing access: {e}")
             _wait_for_uniform_response(start_time, 0.3)
-            return jsonify({"success": False, "error": str(e)})
+            return _json_response({"success": False, "error": str(e)})
     
     @app.route("/s/<access_id>")
     def access_status(access_id: str):
         """API endpoint to check access status."""
-        start_time = time.time()
+        start_time = time.monotonic()
         
         try:
             # Validate access_id format (should be UUID)
@@ -571,7 +566,8 @@ def create_app() -> Flask:
                 _wait_for_uniform_response(start_time, 0.2)
                 return "OK", 200
                 
-            if not _validate_ip_headers(request):
+            headers = _snapshot_headers(request)
+            if not _validate_ip_headers(headers, nginx_enabled):
                 logger.warning("Invalid IP headers detected in access_status")
                 _wait_for_uniform_response(start_time, 0.2)
                 return "OK", 200
@@ -583,7 +579,7 @@ def create_app() -> Flask:
             if not access_request:
                 return "OK", 200
             
-            return jsonify({
+            return _json_response({
                 "access_id": access_request.id,
                 "status": access_request.status.value,
                 "ip_address": access_request.ip_address,
@@ -606,57 +602,50 @@ def create_app() -> Flask:
     return app
 
 
-@staticmethod
-def _add_security_headers(resp):
-    """Add baseline security headers to every response."""
-    resp.headers['Referrer-Policy'] = 'no-referrer'
-    resp.headers['X-Content-Type-Options'] = 'nosniff'
-    resp.headers['X-Frame-Options'] = 'DENY'
-    return resp
-
-
-
 def _validate_ip_address(ip_str: str) -> str:
     """Validate IP address format and return normalized IP."""
+    normalized_ip, rejection = _normalize_ip_address(ip_str)
+    if rejection:
+        # Logged per request, outside the cache, so repeated attempts stay visible
+        logger.warning(rejection)
+    return normalized_ip
+
+
+@lru_cache(maxsize=4096)
+def _normalize_ip_address(ip_str: str) -> Tuple[str, Optional[str]]:
+    """Parse an IP string once per distinct value: (normalized IP, rejection reason)."""
     try:
         # Parse and validate IP address
         ip_obj = ipaddress.ip_address(ip_str.strip())
-        
-        # Check for dangerous IP ranges
-        if ip_obj.is_private and not ip_obj.is_loopback:
-            logger.debug(f"Private IP detected: {ip_obj}")
-        elif ip_obj.is_loopback:
-            logger.debug(f"Loopback IP detected: {ip_obj}")
-        elif ip_obj.is_multicast:
-            logger.warning(f"Multicast IP rejected: {ip_obj}")
-            return "127.0.0.1"
-        elif ip_obj.is_reserved:
-            logger.warning(f"Reserved IP rejected: {ip_obj}")
-            return "127.0.0.1"
-            
-        return str(ip_obj)
-        
-    except (ipaddress.AddressValueError, ValueError) as e:
-        logger.warning(f"Invalid IP address format '{ip_str}': {e}")
-        return "127.0.0.1"
+    except ValueError as e:
+        return "127.0.0.1", f"Invalid IP address format '{ip_str}': {e}"
 
+    # Check for dangerous IP ranges (private and loopback are accepted)
+    if not ip_obj.is_private and not ip_obj.is_loopback:
+        if ip_obj.is_multicast:
+            return "127.0.0.1", f"Multicast IP rejected: {ip_obj}"
+        if ip_obj.is_reserved:
+            return "127.0.0.1", f"Reserved IP rejected: {ip_obj}"
 
-def _get_client_ip(request) -> str:
+    return str(ip_obj), None
+
+
+def _get_client_ip(headers: Dict[str, str], remote_addr: Optional[str], nginx_enabled: bool) -> str:
     """Extract client IP address from request with validation."""
     
-    if config.nginx_enabled:
+    if nginx_enabled:
         # NGINX MODE: Trust but validate proxy headers from nginx
         logger.debug("NGINX mode: Using proxy headers for IP detection")
         
         # nginx sets X-Real-IP with the actual client IP
-        real_ip = request.headers.get("X-Real-IP")
+        real_ip = headers.get("x-real-ip")
         if real_ip:
             validated_ip = _validate_ip_address(real_ip)
             logger.debug(f"Using nginx X-Real-IP: {real_ip} -> {validated_ip}")
             return validated_ip
             
         # Fallback to X-Forwarded-For from nginx
-        forwarded_for = request.headers.get("X-Forwarded-For")
+        forwarded_for = headers.get("x-forwarded-for")
         if forwarded_for:
             client_ip = forwarded_for.split(",")[0].strip()
             validated_ip = _validate_ip_address(client_ip)
@@ -671,26 +660,20 @@ def _get_client_ip(request) -> str:
         # DIRECT MODE: FAB determines IP itself (current logic)
         logger.debug("Direct mode: FAB detecting IP with Telegram filtering")
         
-        forwarded_for = request.headers.get("X-Forwarded-For")
-        real_ip = request.headers.get("X-Real-IP")
-        remote_addr = request.remote_addr
+        forwarded_for = headers.get("x-forwarded-for")
+        real_ip = headers.get("x-real-ip")
         
         # Skip Telegram server IPs - they are not real users
-        telegram_ips = ["149.154.167.", "149.154.175.", "91.108.4.", "91.108.56.", "91.108.8."]
-        
-        if remote_addr:
-            for telegram_ip in telegram_ips:
-                if remote_addr.startswith(telegram_ip):
-                    logger.debug(f"Skipping Telegram server IP: {remote_addr}")
-                    return "127.0.0.1"  # Default fallback for Telegram requests
+        if remote_addr and TELEGRAM_IP_PREFIX.match(remote_addr):
+            logger.debug(f"Skipping Telegram server IP: {remote_addr}")
+            return "127.0.0.1"  # Default fallback for Telegram requests
         
         if forwarded_for:
             client_ip = forwarded_for.split(",")[0].strip()
             # Check if forwarded IP is also Telegram
-            for telegram_ip in telegram_ips:
-                if client_ip.startswith(telegram_ip):
-                    logger.debug(f"Skipping Telegram forwarded IP: {client_ip}")
-                    return "127.0.0.1"
+            if TELEGRAM_IP_PREFIX.match(client_ip):
+                logger.debug(f"Skipping Telegram forwarded IP: {client_ip}")
+                return "127.0.0.1"
             validated_ip = _validate_ip_address(client_ip)
             logger.debug(f"Using X-Forwarded-For IP: {client_ip} -> {validated_ip}")
             return validated_ip
@@ -706,7 +689,7 @@ def _get_client_ip(request) -> str:
 
 def _wait_for_uniform_response(start_time: float, target_duration: float) -> None:
     """Wait to ensure uniform response time."""
-    elapsed = time.time() - start_time
+    elapsed = time.monotonic() - start_time
     if elapsed < target_duration:
         time.sleep(target_duration - elapsed)
 
@@ -723,18 +706,33 @@ class WebServer:
     def start(self) -> None:
         """Start web server in a separate thread."""
         try:
-            self.server = make_server(
-                config.host,
-                config.http_port,
-                self.app,
-                threaded=True
-            )
+            if WAITRESS_AVAILABLE:
+                # Production WSGI server with a fixed worker thread pool; handlers
+                # block while padding responses, so the pool must cover that
+                self.server = create_waitress_server(
+                    self.app,
+                    host=config.host,
+                    port=config.http_port,
+                    threads=config.web_server_threads,
+                    connection_limit=max(100, config.web_server_threads * 2)
+                )
+                serve = self.server.run
+            else:
+                # Fallback: Werkzeug spawns a thread per request
+                self.server = make_server(
+                    config.host,
+                    config.http_port,
+                    self.app,
+                    threaded=True
+                )
+                serve = self.server.serve_forever
             
-            self.thread = threading.Thread(target=self.server.serve_forever)
+            self.thread = threading.Thread(target=serve)
             self.thread.daemon = True
             self.thread.start()
             
-            logger.info(f"Web server started on {config.host}:{config.http_port}")
+            server_name = "waitress" if WAITRESS_AVAILABLE else "werkzeug"
+            logger.info(f"Web server ({server_name}) started on {config.host}:{config.http_port}")
             
         except Exception as e:
             logger.error(f"Failed to start web server: {e}")
@@ -744,7 +742,19 @@ class WebServer:
         """Stop web server."""
         try:
             if self.server:
-                self.server.shutdown()
+                if WAITRESS_AVAILABLE:
+                    # Let in-flight requests finish, then close the listener
+                    # from inside the serving loop (closing it from this
+                    # thread races the loop's select)
+                    self.server.task_dispatcher.shutdown()
+                    if hasattr(self.server, 'trigger'):
+                        self.server.trigger.pull_trigger(self.server.close)
+                    else:
+                        # MultiSocketServer (HOST resolved to several
+                        # addresses) has no trigger; close all its sockets
+                        self.server.close()
+                else:
+                    self.server.shutdown()
                 logger.info("Web server stopped")
         except Exception as e:
             logger.error(f"Error stopping web server: {e}")
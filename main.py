@@ -34,6 +34,7 @@ class FABApplication:
         self.database = None
         self.executor = ThreadPoolExecutor(max_workers=2)
         self.shutdown_event = asyncio.Event()
+        self._shutdown_task = None
         
     async def start(self) -> None:
         """Start all application components."""
@@ -161,12 +162,23 @@ class FABApplication:
     
     def _setup_signal_handlers(self) -> None:
         """Setup signal handlers for graceful shutdown."""
-        def signal_handler(signum, frame):
+        loop = asyncio.get_running_loop()
+
+        def signal_handler(signum: int) -> None:
             logger.info(f"Received signal {signum}, initiating shutdown...")
-            asyncio.create_task(self._handle_shutdown())
-        
-        signal.signal(signal.SIGINT, signal_handler)
-        signal.signal(signal.SIGTERM, signal_handler)
+            # Keep a reference so the shutdown task is not garbage collected
+            self._shutdown_task = loop.create_task(self._handle_shutdown())
+
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            try:
+                # Handler runs inside the event loop, so the task lands on it
+                loop.add_signal_handler(signum, signal_handler, signum)
+            except NotImplementedError:
+                # Event loops without add_signal_handler (Windows)
+                signal.signal(
+                    signum,
+                    lambda s, frame: loop.call_soon_threadsafe(signal_handler, s)
+                )
     
     async def _handle_shutdown(self) -> None:
         """Handle shutdown sequence."""
@@ -6,25 +6,140 @@ Checks for syntax errors, logic errors, and runtime issues.
 
 import ast
 import importlib
-import inspect
+import importlib.util
+import itertools
 import logging
 import os
+import re
 import sys
-import traceback
 from pathlib import Path
-from typing import List, Dict, Any, Callable
-import sqlite3
-import json
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+try:
+    from dotenv import dotenv_values
+    DOTENV_AVAILABLE = True
+except ImportError:
+    DOTENV_AVAILABLE = False
 
 # Configure logging for tests
 logging.basicConfig(level=logging.INFO, format='%(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# KEY=value lines of an env file (fallback parser when python-dotenv is missing)
+_ENV_RE = re.compile(r'^[ \t]*([A-Za-z_][A-Za-z0-9_]*)[ \t]*=(.*)$', re.M)
+
+# Directory names and entry prefixes never scanned by the static checks
+_SKIP_DIRS = frozenset({'venv', '.venv', '__pycache__', '.git', '.tox', 'node_modules'})
+_SKIP_PREFIXES = ('test_',)
+
+# Optional external dependencies; their imports pass without being resolved
+_OPTIONAL_PREFIXES = ('telegram', 'flask', 'paho', 'werkzeug', 'dotenv')
+
+# Trees with at least this many sources are syntax-checked in worker processes
+PARALLEL_PARSE_THRESHOLD = 200
+# Sources sent to a parse worker per IPC round-trip
+PARSE_CHUNK_SIZE = 64
+
+# AST fields holding nested statement lists; imports are statements, so only these are scanned
+_STATEMENT_FIELDS = ('body', 'orelse', 'finalbody', 'handlers', 'cases')
+
+# Common patterns that might indicate bugs: group name -> (pattern, description).
+# Patterns must not span lines: they are matched against whole files.
+_LOGIC_PATTERNS = {
+    'is_none': (r'\b[\w.]+[ \t]*==[ \t]*None\b', "Use 'is None' instead of '== None'"),
+    'bare_except': (r'except:', "Bare except clause - specify exception types"),
+    'naive_dt': (r'datetime\.now\(\)', "Use timezone-aware datetime.now(timezone.utc)"),
+    'print_dbg': (r'print\(', "Use logger instead of print for debugging"),
+}
+# Literals each pattern requires; files containing none of them cannot match
+_LOGIC_LITERALS = (b'None', b'except:', b'datetime.now()', b'print(')
+# All patterns fused into one alternation so each file is scanned once
+_LOGIC_RE = re.compile('|'.join(
+    f'(?P<{name}>{pattern})' for name, (pattern, _) in _LOGIC_PATTERNS.items()
+))
+
+
+def _read_bytes(file_path: str) -> bytes:
+    """Read a whole file with one sized os.read (open, fstat, read, close)."""
+    fd = os.open(file_path, os.O_RDONLY)
+    try:
+        # Asking for one byte past st_size lets a short read signal EOF
+        want = os.fstat(fd).st_size + 1
+        chunks = []
+        while True:
+            chunk = os.read(fd, want)
+            chunks.append(chunk)
+            if len(chunk) < want:
+                return b''.join(chunks)
+            want = 65536
+    finally:
+        os.close(fd)
+
+
+def _iter_imports(tree: ast.Module):
+    """Yield Import/ImportFrom nodes, descending through statement bodies but not expressions."""
+    stack = list(reversed(tree.body))
+    while stack:
+        node = stack.pop()
+        if isinstance(node, (ast.Import, ast.ImportFrom)):
+            yield node
+            continue
+        for field in _STATEMENT_FIELDS:
+            children = getattr(node, field, None)
+            if children:
+                stack.extend(reversed(children))
+
+
+def _imported_modules(tree: ast.Module) -> List[str]:
+    """Absolute module names imported by a tree, one entry per import occurrence."""
+    modules = []
+    for node in _iter_imports(tree):
+        if isinstance(node, ast.Import):
+            modules.extend(alias.name for alias in node.names)
+        elif not node.level and node.module:
+            modules.append(node.module)
+    return modules
+
+
+def _parse_and_check(content: bytes, file_path: str) -> ast.Module:
+    """Parse a source and compile the tree, raising SyntaxError for parser and compiler errors."""
+    tree = ast.parse(content, filename=file_path)
+    # Compiling the existing tree (no re-parse) catches e.g. 'return' outside a function
+    compile(tree, file_path, 'exec', dont_inherit=True, optimize=2)
+    return tree
+
+
+def _scan_file(item: Tuple[str, bytes]) -> Tuple[str, Optional[str], Optional[str], Optional[List[str]]]:
+    """Parse one source; returns (path, error kind, error message, imported modules).
+
+    Error kind is None on success; imported modules is None when parsing failed.
+    """
+    file_path, content = item
+    try:
+        tree = _parse_and_check(content, file_path)
+    except SyntaxError as e:
+        return file_path, "Syntax error", f"{file_path}:{e.lineno}: {e.msg}", None
+    except Exception as e:
+        return file_path, "Parse error", f"{file_path}: {e}", None
+    return file_path, None, None, _imported_modules(tree)
+
+
 class FABTestSuite:
     """Comprehensive test suite for FAB application."""
     
     def __init__(self):
         self.project_root = Path(__file__).parent
+        # Make the project importable once for every test
+        if str(self.project_root) not in sys.path:
+            sys.path.insert(0, str(self.project_root))
+            importlib.invalidate_caches()
         self._setup_test_environment()
         self.results = {
             'syntax_errors': [],
@@ -34,8 +149,60 @@ class FABTestSuite:
             'database_errors': [],
             'runtime_errors': []
         }
+        self._error_count = 0
         self.total_tests = 0
         self.passed_tests = 0
+        # Project Python sources, read once and shared by the static checks
+        self._py_sources: Optional[Dict[str, bytes]] = None
+        self._py_read_errors: Dict[str, Exception] = {}
+        # Parsed modules from the syntax check, reused by the import check
+        self._ast_cache: Dict[str, ast.Module] = {}
+        # Imported module names reported by parse workers (trees stay in the workers)
+        self._import_names: Dict[str, List[str]] = {}
+        # Import outcome per module name (True = resolvable or known optional)
+        self._import_cache: Dict[str, bool] = {}
+        # In-memory Database shared by the schema and class tests (schema built once)
+        self._shared_db = None
+        # (ready, Flask test client) shared by the web tests once built
+        self._web_harness: Optional[Tuple[bool, Any]] = None
+    
+    def _iter_source_files(self, suffix: str):
+        """Yield paths of project files ending with suffix, pruning venvs, VCS and test entries."""
+        stack = [str(self.project_root)]
+        while stack:
+            try:
+                entries = os.scandir(stack.pop())
+            except OSError:
+                continue
+            with entries:
+                for entry in entries:
+                    name = entry.name
+                    if name.startswith(_SKIP_PREFIXES):
+                        continue
+                    if entry.is_dir(follow_symlinks=False):
+                        if name not in _SKIP_DIRS:
+                            stack.append(entry.path)
+                    elif name.endswith(suffix):
+                        yield entry.path
+    
+    def _get_py_sources(self) -> Dict[str, bytes]:
+        """Walk the project and read every Python source once (test files and venvs skipped)."""
+        if self._py_sources is None:
+            self._py_sources = {}
+            for file_path in self._iter_source_files(".py"):
+                try:
+                    # Raw bytes: ast.parse handles the encoding cookie itself
+                    self._py_sources[file_path] = _read_bytes(file_path)
+                except Exception as e:
+                    self._py_read_errors[file_path] = e
+        return self._py_sources
+    
+    def _get_shared_db(self):
+        """Return the shared in-memory Database, creating its schema on first use."""
+        if self._shared_db is None:
+            from fab.db.database import Database
+            self._shared_db = Database(':memory:')
+        return self._shared_db
     
     def _setup_test_environment(self):
         """Setup test environment variables."""
@@ -43,11 +210,14 @@ class FABTestSuite:
             # Load test environment if available
             test_env = self.project_root / 'test.env'
             if test_env.exists():
-                with open(test_env, 'r') as f:
-                    for line in f:
-                        if line.strip() and not line.startswith('#'):
-                            key, value = line.strip().split('=', 1)
-                            os.environ[key] = value
+                if DOTENV_AVAILABLE:
+                    values = dotenv_values(test_env)
+                else:
+                    with open(test_env, 'r', encoding='utf-8-sig') as f:
+                        values = {key: value.strip() for key, value in _ENV_RE.findall(f.read())}
+                for key, value in values.items():
+                    if value is not None:
+                        os.environ.setdefault(key, value)
         
     def run_all_tests(self) -> bool:
         """Run all test categories and return overall success."""
@@ -77,136 +247,170 @@ class FABTestSuite:
             try:
                 test_method()
             except Exception as e:
-                logger.error(f"Test {test_method.__name__} failed: {e}")
-                self.results['runtime_errors'].append(f"{test_method.__name__}: {e}")
+                logger.error("Test %s failed: %s", test_method.__name__, e)
+                self._record_error('runtime_errors', f"{test_method.__name__}: {e}")
         
         self.print_results()
-        return len(self.get_all_errors()) == 0
+        return self._error_count == 0
     
     def test_syntax_validation(self):
         """Test all Python files for syntax errors."""
         logger.info("🔍 Testing syntax validation...")
         
-        python_files = list(self.project_root.rglob("*.py"))
-        for file_path in python_files:
-            # Skip test files and virtual environments
-            if any(skip in str(file_path) for skip in ['test_', 'venv', '__pycache__', '.git']):
-                continue
-                
-            try:
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    content = f.read()
-                
-                # Parse with AST
-                ast.parse(content, filename=str(file_path))
-                
-                # Try to compile
-                compile(content, str(file_path), 'exec')
-                
-                self.total_tests += 1
+        sources = self._get_py_sources()
+        for file_path, error in self._py_read_errors.items():
+            error_msg = f"{file_path}: {error}"
+            self._record_error('syntax_errors', error_msg)
+            self.total_tests += 1
+            logger.error("❌ Parse error: %s", error_msg)
+        
+        if len(sources) >= PARALLEL_PARSE_THRESHOLD and (os.cpu_count() or 1) > 1:
+            # Workers return import names instead of trees, which are costly to pickle
+            with ProcessPoolExecutor() as executor:
+                results = list(executor.map(_scan_file, sources.items(), chunksize=PARSE_CHUNK_SIZE))
+            for file_path, _, _, modules in results:
+                if modules is not None:
+                    self._import_names[file_path] = modules
+        else:
+            results = []
+            for file_path, content in sources.items():
+                try:
+                    self._ast_cache[file_path] = _parse_and_check(content, file_path)
+                    results.append((file_path, None, None, None))
+                except Exception:
+                    results.append(_scan_file((file_path, content)))
+        
+        for file_path, kind, error_msg, _ in results:
+            self.total_tests += 1
+            if kind is None:
                 self.passed_tests += 1
-                
-            except SyntaxError as e:
-                error_msg = f"{file_path}:{e.lineno}: {e.msg}"
-                self.results['syntax_errors'].append(error_msg)
-                self.total_tests += 1
-                logger.error(f"❌ Syntax error: {error_msg}")
-                
-            except Exception as e:
-                error_msg = f"{file_path}: {e}"
-                self.results['syntax_errors'].append(error_msg)
-                self.total_tests += 1
-                logger.error(f"❌ Parse error: {error_msg}")
+                continue
+            self._record_error('syntax_errors', error_msg)
+            logger.error("❌ %s: %s", kind, error_msg)
     
     def test_import_integrity(self):
         """Test that all imports are valid and resolvable."""
         logger.info("📦 Testing import integrity...")
         
-        python_files = list(self.project_root.rglob("*.py"))
-        for file_path in python_files:
-            if any(skip in str(file_path) for skip in ['test_', 'venv', '__pycache__']):
-                continue
-                
+        # Module name -> files importing it (one entry per import statement)
+        module_uses: Dict[str, List[str]] = {}
+        for file_path, content in self._get_py_sources().items():
             try:
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    content = f.read()
-                
-                tree = ast.parse(content)
-                for node in ast.walk(tree):
-                    if isinstance(node, ast.Import):
-                        for alias in node.names:
-                            self._check_import(alias.name, file_path)
-                    elif isinstance(node, ast.ImportFrom):
-                        if node.level and node.level > 0:
-                            continue
-                        if node.module:
-                            self._check_import(node.module, file_path)
+                modules = self._import_names.get(file_path)
+                if modules is None:
+                    tree = self._ast_cache.get(file_path)
+                    if tree is None:
+                        tree = ast.parse(content)
+                    modules = _imported_modules(tree)
+                for module_name in modules:
+                    module_uses.setdefault(module_name, []).append(file_path)
                             
             except Exception as e:
                 error_msg = f"Import check failed for {file_path}: {e}"
-                self.results['import_errors'].append(error_msg)
-                logger.error(f"❌ {error_msg}")
+                self._record_error('import_errors', error_msg)
+                logger.error("❌ %s", error_msg)
+        
+        # Resolve each distinct module once, then report per using file
+        total = passed = 0
+        for module_name, users in module_uses.items():
+            try:
+                ok = self._check_import(module_name)
+            except Exception as e:
+                for file_path in dict.fromkeys(users):
+                    error_msg = f"Import check failed for {file_path}: {e}"
+                    self._record_error('import_errors', error_msg)
+                    logger.error("❌ %s", error_msg)
+                continue
+            if ok is None:
+                continue
+            total += len(users)
+            if ok:
+                passed += len(users)
+            else:
+                for file_path in users:
+                    self._record_error('import_errors', f"{file_path}: Cannot import '{module_name}'")
+        
+        self.total_tests += total
+        self.passed_tests += passed
     
-    def _check_import(self, module_name: str, file_path: Path):
-        """Check if a module can be imported."""
+    def _check_import(self, module_name: str) -> Optional[bool]:
+        """Check if a module can be imported; None for relative and built-in modules."""
         try:
             # Skip relative imports and built-ins
             if module_name.startswith('.') or module_name in sys.builtin_module_names:
-                return
+                return None
             
-            importlib.import_module(module_name)
-            self.total_tests += 1
-            self.passed_tests += 1
+            # Known optional deps are not penalized in the local environment
+            if module_name.startswith(_OPTIONAL_PREFIXES):
+                return True
+            
+            cached = self._import_cache.get(module_name)
+            if cached is None and sys.modules.get(module_name) is not None:
+                cached = self._import_cache[module_name] = True
+            if cached is not None:
+                return cached
+            
+            # Locate the module without executing it (parent packages are still imported)
+            if importlib.util.find_spec(module_name) is None:
+                raise ModuleNotFoundError(f"No module named '{module_name}'", name=module_name)
+            self._import_cache[module_name] = True
+            return True
             
         except ImportError as e:
-            # Treat known optional external deps as warnings (not errors)
+            # A module failing on a missing optional dep is treated as a warning (not an error)
             missing_dep = str(e).lower()
-            if any(known in module_name for known in ['telegram', 'flask', 'paho', 'werkzeug', 'dotenv']) or any(
-                known in missing_dep for known in ['telegram', 'flask', 'paho', 'werkzeug', 'dotenv']
-            ):
+            if any(known in module_name or known in missing_dep for known in _OPTIONAL_PREFIXES):
                 # Count as passed to not penalize local environment
-                self.passed_tests += 1
-                self.total_tests += 1
-                return
-            error_msg = f"{file_path}: Cannot import '{module_name}'"
-            self.results['import_errors'].append(error_msg)
-            self.total_tests += 1
+                self._import_cache[module_name] = True
+                return True
+            self._import_cache[module_name] = False
+            return False
     
     def test_logic_consistency(self):
         """Test for common logic errors and inconsistencies."""
         logger.info("🧠 Testing logic consistency...")
         
-        # Check for common patterns that might indicate bugs
-        patterns_to_check = [
-            (r'if.*\..*==.*None', "Use 'is None' instead of '== None'"),
-            (r'except:', "Bare except clause - specify exception types"),
-            (r'datetime\.now\(\)', "Use timezone-aware datetime.now(timezone.utc)"),
-            (r'print\(', "Use logger instead of print for debugging"),
-        ]
-        
-        python_files = list(self.project_root.rglob("*.py"))
-        for file_path in python_files:
-            if any(skip in str(file_path) for skip in ['test_', 'venv', '__pycache__']):
-                continue
-                
+        # Every (line, pattern) pair counts as one test
+        checks_per_line = len(_LOGIC_PATTERNS)
+        total = passed = 0
+        for file_path, content in self._get_py_sources().items():
             try:
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    lines = f.readlines()
+                line_count = content.count(b'\n')
+                if content and not content.endswith(b'\n'):
+                    line_count += 1
+                checks = line_count * checks_per_line
+                # Files are only decoded once a required literal is present
+                if not any(literal in content for literal in _LOGIC_LITERALS):
+                    total += checks
+                    passed += checks
+                    continue
                 
-                for i, line in enumerate(lines, 1):
-                    import re
-                    for pattern, description in patterns_to_check:
-                        if re.search(pattern, line):
-                            error_msg = f"{file_path}:{i}: {description} - '{line.strip()}'"
-                            self.results['logic_errors'].append(error_msg)
-                            self.total_tests += 1
-                            logger.warning(f"⚠️ Logic issue: {error_msg}")
-                        else:
-                            self.total_tests += 1
-                            self.passed_tests += 1
+                text = content.decode('utf-8')
+                hits: Dict[int, set] = {}
+                line_no, pos = 1, 0
+                for match in _LOGIC_RE.finditer(text):
+                    start = match.start()
+                    line_no += text.count('\n', pos, start)
+                    pos = start
+                    hits.setdefault(line_no, set()).add(match.lastgroup)
+                
+                lines = text.split('\n') if hits else ()
+                failed = 0
+                for i, names in hits.items():
+                    for name, (_, description) in _LOGIC_PATTERNS.items():
+                        if name in names:
+                            error_msg = f"{file_path}:{i}: {description} - '{lines[i - 1].strip()}'"
+                            self._record_error('logic_errors', error_msg)
+                            logger.warning("⚠️ Logic issue: %s", error_msg)
+                            failed += 1
+                total += checks
+                passed += checks - failed
                             
             except Exception as e:
-                logger.error(f"Logic check failed for {file_path}: {e}")
+                logger.error("Logic check failed for %s: %s", file_path, e)
+        
+        self.total_tests += total
+        self.passed_tests += passed
     
     def test_configuration(self):
         """Test configuration consistency and completeness."""
@@ -214,7 +418,6 @@ class FABTestSuite:
         
         try:
             # Test config file can be imported
-            sys.path.insert(0, str(self.project_root))
             from fab.config import Config
             
             # Test config initialization
@@ -232,8 +435,8 @@ class FABTestSuite:
             for attr in required_attrs:
                 if not hasattr(config, attr):
                     error_msg = f"Missing required config attribute: {attr}"
-                    self.results['config_errors'].append(error_msg)
-                    logger.error(f"❌ {error_msg}")
+                    self._record_error('config_errors', error_msg)
+                    logger.error("❌ %s", error_msg)
                 else:
                     self.passed_tests += 1
                 self.total_tests += 1
@@ -243,12 +446,12 @@ class FABTestSuite:
                     self.passed_tests += 1
                 else:
                     error_msg = f"Missing config attribute: {attr}"
-                    self.results['config_errors'].append(error_msg)
-                    logger.error(f"❌ {error_msg}")
+                    self._record_error('config_errors', error_msg)
+                    logger.error("❌ %s", error_msg)
                 self.total_tests += 1
             if hasattr(config, 'vk_enabled'):
                 if not isinstance(config.vk_enabled, bool):
-                    self.results['config_errors'].append("config.vk_enabled should be bool")
+                    self._record_error('config_errors', "config.vk_enabled should be bool")
                     logger.error("❌ config.vk_enabled should be bool")
                 else:
                     self.passed_tests += 1
@@ -260,16 +463,16 @@ class FABTestSuite:
                 for attr in mqtt_attrs:
                     if not hasattr(config, attr):
                         error_msg = f"MQTT enabled but missing: {attr}"
-                        self.results['config_errors'].append(error_msg)
-                        logger.error(f"❌ {error_msg}")
+                        self._record_error('config_errors', error_msg)
+                        logger.error("❌ %s", error_msg)
                     else:
                         self.passed_tests += 1
                     self.total_tests += 1
                     
         except Exception as e:
             error_msg = f"Config test failed: {e}"
-            self.results['config_errors'].append(error_msg)
-            logger.error(f"❌ {error_msg}")
+            self._record_error('config_errors', error_msg)
+            logger.error("❌ %s", error_msg)
             self.total_tests += 1
     
     def test_database_schema(self):
@@ -277,15 +480,8 @@ class FABTestSuite:
         logger.info("🗄️ Testing database schema...")
         
         try:
-            # Create temporary in-memory database for testing
-            test_db = sqlite3.connect(':memory:')
-            
             # Test that database schema can be created
-            sys.path.insert(0, str(self.project_root))
-            from fab.db.database import Database
-            
-            # This should work without errors
-            db = Database(':memory:')
+            db = self._get_shared_db()
             
             # Test basic operations
             conn = db.get_connection()
@@ -301,8 +497,8 @@ class FABTestSuite:
                     self.passed_tests += 1
                 else:
                     error_msg = f"Missing database table: {table}"
-                    self.results['database_errors'].append(error_msg)
-                    logger.error(f"❌ {error_msg}")
+                    self._record_error('database_errors', error_msg)
+                    logger.error("❌ %s", error_msg)
                 self.total_tests += 1
 
             # New code: tables must have 'source' column (multi-platform support)
@@ -315,35 +511,37 @@ class FABTestSuite:
                     self.passed_tests += 1
                 else:
                     error_msg = f"Table {table} missing column 'source'"
-                    self.results['database_errors'].append(error_msg)
-                    logger.error(f"❌ {error_msg}")
+                    self._record_error('database_errors', error_msg)
+                    logger.error("❌ %s", error_msg)
                 self.total_tests += 1
-
-            conn.close()
             
         except Exception as e:
             error_msg = f"Database schema test failed: {e}"
-            self.results['database_errors'].append(error_msg)
-            logger.error(f"❌ {error_msg}")
+            self._record_error('database_errors', error_msg)
+            logger.error("❌ %s", error_msg)
             self.total_tests += 1
     
     def test_json_files(self):
         """Test JSON files for valid syntax."""
         logger.info("📋 Testing JSON files...")
+        import json
         
-        json_files = list(self.project_root.rglob("*.json"))
-        for file_path in json_files:
+        for file_path in self._iter_source_files(".json"):
             try:
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    json.load(f)
+                data = _read_bytes(file_path)
+                # orjson.JSONDecodeError subclasses json.JSONDecodeError
+                if ORJSON_AVAILABLE:
+                    orjson.loads(data)
+                else:
+                    json.loads(data)
                 self.total_tests += 1
                 self.passed_tests += 1
                 
             except json.JSONDecodeError as e:
                 error_msg = f"{file_path}: Invalid JSON - {e}"
-                self.results['syntax_errors'].append(error_msg)
+                self._record_error('syntax_errors', error_msg)
                 self.total_tests += 1
-                logger.error(f"❌ {error_msg}")
+                logger.error("❌ %s", error_msg)
     
     def test_runtime_imports(self):
         """Test that main modules can be imported at runtime."""
@@ -367,9 +565,9 @@ class FABTestSuite:
                 
             except Exception as e:
                 error_msg = f"Cannot import {module_name}: {e}"
-                self.results['runtime_errors'].append(error_msg)
+                self._record_error('runtime_errors', error_msg)
                 self.total_tests += 1
-                logger.error(f"❌ {error_msg}")
+                logger.error("❌ %s", error_msg)
     
     def test_class_initialization(self):
         """Test that main classes can be initialized properly."""
@@ -383,8 +581,7 @@ class FABTestSuite:
             self.total_tests += 1
             
             # Test Database (memory)
-            from fab.db.database import Database
-            db = Database(':memory:')
+            db = self._get_shared_db()
             self.passed_tests += 1
             self.total_tests += 1
             
@@ -401,7 +598,7 @@ class FABTestSuite:
             # Test persistent connection features
             publisher = mqtt_service.publisher
             required_attrs = [
-                '_connection_lock', '_monitor_running',
+                '_connection_lock', '_connected',
                 '_last_connect_attempt'
             ]
             
@@ -420,9 +617,9 @@ class FABTestSuite:
             
         except Exception as e:
             error_msg = f"Class initialization failed: {e}"
-            self.results['runtime_errors'].append(error_msg)
+            self._record_error('runtime_errors', error_msg)
             self.total_tests += 1
-            logger.error(f"❌ {error_msg}")
+            logger.error("❌ %s", error_msg)
 
     # --------------------
     # Web API tests
@@ -440,8 +637,8 @@ class FABTestSuite:
             access_module._initialize_access_manager()
             return True
         except Exception as e:
-            self.results['runtime_errors'].append(f"setup_in_memory_db: {e}")
-            logger.error(f"❌ DB setup failed: {e}")
+            self._record_error('runtime_errors', f"setup_in_memory_db: {e}")
+            logger.error("❌ DB setup failed: %s", e)
             return False
 
     def _create_app(self):
@@ -449,9 +646,21 @@ class FABTestSuite:
             from fab.web.server import create_app
             return create_app()
         except ImportError as e:
-            logger.warning(f"Skipping web tests (missing dependency): {e}")
+            logger.warning("Skipping web tests (missing dependency): %s", e)
             return None
 
+    def _get_web_client(self) -> Tuple[bool, Any]:
+        """Return (ready, test client) for the web tests, building the DB and app once per run.
+
+        ready is False when the in-memory DB could not be set up; client is None without Flask.
+        """
+        if self._web_harness is None:
+            if not self._setup_in_memory_db():
+                return False, None
+            app = self._create_app()
+            self._web_harness = (True, app.test_client() if app is not None else None)
+        return self._web_harness
+
     def test_source_in_models(self):
         """Test that source (telegram/vk) is stored and retrieved in whitelist, sessions, access_requests."""
         logger.info("🔀 Testing source in models...")
@@ -475,18 +684,18 @@ class FABTestSuite:
             if WhitelistUser.is_whitelisted(SOURCE_TELEGRAM, 1001) and WhitelistUser.is_whitelisted(SOURCE_VK, 2001):
                 self.passed_tests += 1
             else:
-                self.results['logic_errors'].append("WhitelistUser is_whitelisted(source, id) failed")
+                self._record_error('logic_errors', "WhitelistUser is_whitelisted(source, id) failed")
             self.total_tests += 1
             tg_list = WhitelistUser.get_all(SOURCE_TELEGRAM)
             vk_list = WhitelistUser.get_all(SOURCE_VK)
             if len(tg_list) == 1 and tg_list[0].telegram_user_id == 1001 and tg_list[0].source == SOURCE_TELEGRAM:
                 self.passed_tests += 1
             else:
-                self.results['logic_errors'].append("WhitelistUser get_all(SOURCE_TELEGRAM) failed")
+                self._record_error('logic_errors', "WhitelistUser get_all(SOURCE_TELEGRAM) failed")
             if len(vk_list) == 1 and vk_list[0].telegram_user_id == 2001 and vk_list[0].source == SOURCE_VK:
                 self.passed_tests += 1
             else:
-                self.results['logic_errors'].append("WhitelistUser get_all(SOURCE_VK) failed")
+                self._record_error('logic_errors', "WhitelistUser get_all(SOURCE_VK) failed")
             self.total_tests += 2
 
             # Session: create with source, check session.source
@@ -496,14 +705,14 @@ class FABTestSuite:
             if s_tg.source == SOURCE_TELEGRAM and s_vk.source == SOURCE_VK:
                 self.passed_tests += 1
             else:
-                self.results['logic_errors'].append("UserSession create source mismatch")
+                self._record_error('logic_errors', "UserSession create source mismatch")
             got_tg = UserSession.get_by_token(s_tg.token)
             got_vk = UserSession.get_by_token(s_vk.token)
             self.total_tests += 1
             if got_tg and got_tg.source == SOURCE_TELEGRAM and got_vk and got_vk.source == SOURCE_VK:
                 self.passed_tests += 1
             else:
-                self.results['logic_errors'].append("UserSession get_by_token source mismatch")
+                self._record_error('logic_errors', "UserSession get_by_token source mismatch")
             self.total_tests += 1
 
             # AccessRequest: create with source, get_active_for_user(source, id)
@@ -514,62 +723,50 @@ class FABTestSuite:
             if len(active_tg) == 1 and active_tg[0].source == SOURCE_TELEGRAM and len(active_vk) == 1 and active_vk[0].source == SOURCE_VK:
                 self.passed_tests += 1
             else:
-                self.results['logic_errors'].append("AccessRequest get_active_for_user(source, id) failed")
+                self._record_error('logic_errors', "AccessRequest get_active_for_user(source, id) failed")
             self.total_tests += 1
 
             # db_manager with source (is_user_authorized uses whitelist per source)
             if db_manager.is_user_authorized(1001, SOURCE_TELEGRAM) and db_manager.is_user_authorized(2001, SOURCE_VK):
                 self.passed_tests += 1
             else:
-                self.results['logic_errors'].append("db_manager is_user_authorized(source, id) failed")
+                self._record_error('logic_errors', "db_manager is_user_authorized(source, id) failed")
             self.total_tests += 1
             if len(db_manager.get_whitelist_users(SOURCE_TELEGRAM)) == 1 and len(db_manager.get_whitelist_users(SOURCE_VK)) == 1:
                 self.passed_tests += 1
             else:
-                self.results['logic_errors'].append("db_manager get_whitelist_users(source) failed")
+                self._record_error('logic_errors', "db_manager get_whitelist_users(source) failed")
             self.total_tests += 1
         except Exception as e:
-            self.results['runtime_errors'].append(f"test_source_in_models: {e}")
-            logger.error(f"❌ test_source_in_models: {e}")
+            self._record_error('runtime_errors', f"test_source_in_models: {e}")
+            logger.error("❌ test_source_in_models: %s", e)
 
     def test_vk_bot_module(self):
         """Test that VK bot module can be imported and create_vk_bot() works (no start)."""
         logger.info("🤖 Testing VK bot module...")
         try:
-            sys.path.insert(0, str(self.project_root))
             from fab.bot.vk_bot import create_vk_bot, VKBot
             bot = create_vk_bot()
             self.total_tests += 1
             if isinstance(bot, VKBot):
                 self.passed_tests += 1
             else:
-                self.results['runtime_errors'].append("create_vk_bot() did not return VKBot instance")
+                self._record_error('runtime_errors', "create_vk_bot() did not return VKBot instance")
             self.total_tests += 1
         except Exception as e:
-            self.results['runtime_errors'].append(f"test_vk_bot_module: {e}")
-            logger.error(f"❌ test_vk_bot_module: {e}")
+            self._record_error('runtime_errors', f"test_vk_bot_module: {e}")
+            logger.error("❌ test_vk_bot_module: %s", e)
 
     def test_web_open_returns_json(self):
         """Open endpoint must return JSON even on invalid token."""
         try:
-            if not self._setup_in_memory_db():
-                return
-            app = self._create_app()
-            if app is None:
-                self.passed_tests += 1
-                self.total_tests += 1
+            ready, client = self._get_web_client()
+            if not ready:
                 return
-            app = self._create_app()
-            if app is None:
+            if client is None:
                 self.passed_tests += 1
                 self.total_tests += 1
                 return
-            app = self._create_app()
-            if app is None:
-                self.passed_tests += 1
-                self.total_tests += 1
-                return
-            client = app.test_client()
             # Invalid token (not UUID v4)
             resp = client.post('/a/not-a-uuid', json={'duration': 3600}, headers={
                 'X-Real-IP': '1.2.3.4'
@@ -582,24 +779,22 @@ class FABTestSuite:
             if resp.status_code == 200 and isinstance(data, dict):
                 self.passed_tests += 1
             else:
-                self.results['runtime_errors'].append('open_returns_json: response not JSON')
+                self._record_error('runtime_errors', 'open_returns_json: response not JSON')
         except Exception as e:
-            self.results['runtime_errors'].append(f"test_web_open_returns_json: {e}")
+            self._record_error('runtime_errors', f"test_web_open_returns_json: {e}")
 
     def test_web_repeat_open_from_same_ip(self):
         """Repeat open with same token and IP should create new access and leave only one active."""
         try:
-            if not self._setup_in_memory_db():
+            ready, client = self._get_web_client()
+            if not ready:
                 return
             # Create session
             from fab.models import access as access_module
-            from fab.config import config
-            app = self._create_app()
-            if app is None:
+            if client is None:
                 self.passed_tests += 1
                 self.total_tests += 1
                 return
-            client = app.test_client()
             session = access_module.access_manager.create_session(
                 telegram_user_id=1111, chat_id=2222, expiry_seconds=3600
             )
@@ -621,24 +816,23 @@ class FABTestSuite:
                 if only_one:
                     self.passed_tests += 2
                 else:
-                    self.results['logic_errors'].append('repeat_open: more than one active request remains')
+                    self._record_error('logic_errors', 'repeat_open: more than one active request remains')
             else:
-                self.results['runtime_errors'].append('repeat_open: open did not succeed twice')
+                self._record_error('runtime_errors', 'repeat_open: open did not succeed twice')
         except Exception as e:
-            self.results['runtime_errors'].append(f"test_web_repeat_open_from_same_ip: {e}")
+            self._record_error('runtime_errors', f"test_web_repeat_open_from_same_ip: {e}")
 
     def test_web_close_returns_json(self):
         """Close endpoint must return JSON and mark request closed."""
         try:
-            if not self._setup_in_memory_db():
+            ready, client = self._get_web_client()
+            if not ready:
                 return
             from fab.models import access as access_module
-            app = self._create_app()
-            if app is None:
+            if client is None:
                 self.passed_tests += 1
                 self.total_tests += 1
                 return
-            client = app.test_client()
             session = access_module.access_manager.create_session(
                 telegram_user_id=3333, chat_id=4444, expiry_seconds=3600
             )
@@ -647,7 +841,7 @@ class FABTestSuite:
             access_id = d_open.get('access_id')
             self.total_tests += 1
             if not access_id:
-                self.results['runtime_errors'].append('close_returns_json: open did not return access_id')
+                self._record_error('runtime_errors', 'close_returns_json: open did not return access_id')
                 return
             r_close = client.post(f"/c/{access_id}", json={'token': session.token}, headers={'X-Real-IP': '5.6.7.8'})
             d_close = r_close.get_json() or {}
@@ -656,9 +850,9 @@ class FABTestSuite:
             if ok:
                 self.passed_tests += 2
             else:
-                self.results['runtime_errors'].append('close_returns_json: close did not return success')
+                self._record_error('runtime_errors', 'close_returns_json: close did not return success')
         except Exception as e:
-            self.results['runtime_errors'].append(f"test_web_close_returns_json: {e}")
+            self._record_error('runtime_errors', f"test_web_close_returns_json: {e}")
     
     def test_method_signatures(self):
         """Test that method signatures are consistent."""
@@ -676,13 +870,8 @@ class FABTestSuite:
         from fab.config import Config
         
         # Temporarily clear specific env vars to test defaults
-        original_env = {}
-        test_vars = ['HTTP_PORT', 'HOST', 'LOG_LEVEL', 'MQTT_ENABLED']
-        
-        for var in test_vars:
-            original_env[var] = os.environ.get(var)
-            if var in os.environ:
-                del os.environ[var]
+        test_vars = ('HTTP_PORT', 'HOST', 'LOG_LEVEL', 'MQTT_ENABLED')
+        original_env = {var: os.environ.pop(var, None) for var in test_vars}
         
         try:
             config = Config()
@@ -700,51 +889,52 @@ class FABTestSuite:
                     self.passed_tests += 1
                 else:
                     error_msg = f"Default value mismatch for {attr}: expected {expected}, got {actual}"
-                    self.results['config_errors'].append(error_msg)
-                    logger.error(f"❌ {error_msg}")
+                    self._record_error('config_errors', error_msg)
+                    logger.error("❌ %s", error_msg)
                 self.total_tests += 1
                 
         finally:
             # Restore environment
-            for var, value in original_env.items():
-                if value is not None:
-                    os.environ[var] = value
+            os.environ.update({var: value for var, value in original_env.items() if value is not None})
     
-    def get_all_errors(self) -> List[str]:
-        """Get all errors from all categories."""
-        all_errors = []
-        for category, errors in self.results.items():
-            all_errors.extend(errors)
-        return all_errors
+    def _record_error(self, category: str, message: str):
+        """Store an error under its category and keep the running total."""
+        self.results[category].append(message)
+        self._error_count += 1
+    
+    def get_all_errors(self) -> Iterator[str]:
+        """Iterate over errors from all categories."""
+        return itertools.chain.from_iterable(self.results.values())
     
     def print_results(self):
         """Print comprehensive test results."""
-        print("\n" + "="*80)
-        print("🧪 FAB TEST SUITE RESULTS")
-        print("="*80)
+        out = ["", "=" * 80, "🧪 FAB TEST SUITE RESULTS", "=" * 80]
         
-        total_errors = len(self.get_all_errors())
+        total_errors = self._error_count
         
-        print(f"📊 SUMMARY:")
-        print(f"   Total Tests: {self.total_tests}")
-        print(f"   Passed: {self.passed_tests}")
-        print(f"   Failed: {self.total_tests - self.passed_tests}")
-        print(f"   Success Rate: {(self.passed_tests/self.total_tests*100):.1f}%" if self.total_tests > 0 else "N/A")
+        out.append("📊 SUMMARY:")
+        out.append(f"   Total Tests: {self.total_tests}")
+        out.append(f"   Passed: {self.passed_tests}")
+        out.append(f"   Failed: {self.total_tests - self.passed_tests}")
+        out.append(f"   Success Rate: {(self.passed_tests/self.total_tests*100):.1f}%" if self.total_tests > 0 else "N/A")
         
         for category, errors in self.results.items():
             if errors:
-                print(f"\n❌ {category.upper().replace('_', ' ')} ({len(errors)} errors):")
+                out.append(f"\n❌ {category.upper().replace('_', ' ')} ({len(errors)} errors):")
                 for error in errors[:5]:  # Show first 5 errors
-                    print(f"   • {error}")
+                    out.append(f"   • {error}")
                 if len(errors) > 5:
-                    print(f"   ... and {len(errors) - 5} more")
+                    out.append(f"   ... and {len(errors) - 5} more")
         
         if total_errors == 0:
-            print("\n🎉 ALL TESTS PASSED! No errors found.")
+            out.append("\n🎉 ALL TESTS PASSED! No errors found.")
         else:
-            print(f"\n⚠️ Found {total_errors} total errors that need attention.")
+            out.append(f"\n⚠️ Found {total_errors} total errors that need attention.")
         
-        print("="*80)
+        out.append("=" * 80)
+        # One write for the whole report
+        sys.stdout.write("\n".join(out) + "\n")
+        sys.stdout.flush()
 
 
 def main():